@@ -1,15 +1,27 @@
-from fastapi import FastAPI, WebSocket
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, WebSocket
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-import base64
-import wave
+from openai import AsyncOpenAI
+from binascii import a2b_base64
+import httpx
+import hashlib
+import math
 import asyncio
-import os
+from collections import OrderedDict
+from itertools import islice
 from datetime import datetime
-import json
+import orjson
+import os
+import struct
 import uuid
 
-app = FastAPI()
+try:
+    import audioop
+except ImportError:  # removed in Python 3.13
+    audioop = None
+
+app = FastAPI(default_response_class=ORJSONResponse)
+openai_client = None  # created on first transcription, see get_openai_client
 
 # Enable CORS for browser access from anywhere
 app.add_middleware(
@@ -24,12 +36,52 @@ SAMPLE_RATE = 16000
 CHANNELS = 1
 SAMPLE_WIDTH = 2
 
+# RIFF/WAVE header for the fixed audio format, sizes are patched per file
+WAV_HEADER_TEMPLATE = struct.pack(
+    "<4sI4s4sIHHIIHH4sI",
+    b"RIFF", 0, b"WAVE",
+    b"fmt ", 16, 1, CHANNELS, SAMPLE_RATE,
+    SAMPLE_RATE * SAMPLE_WIDTH * CHANNELS, SAMPLE_WIDTH * CHANNELS, SAMPLE_WIDTH * 8,
+    b"data", 0
+)
+
 # Store multiple recordings
-recordings = {}  # {recording_id: {audio_data, transcripts, start_time, end_time}}
+recordings = OrderedDict()  # {recording_id: {audio_chunks, transcripts, start_time, end_time}}
 current_recording_id = None
 active_websockets = set()
+background_tasks = set()
+transcript_cache = OrderedDict()  # {audio hash: transcript text}
 
 TRANSCRIPTION_CHUNK_SIZE = SAMPLE_RATE * 2 * 3  # 3 seconds
+BROADCAST_SEND_TIMEOUT = 2.0  # seconds
+BROADCAST_BATCH_SIZE = 50
+MAX_RECORDINGS = 100  # oldest recordings are evicted beyond this
+TRANSCRIPT_CACHE_SIZE = 256
+SILENCE_RMS_THRESHOLD = 300  # chunks quieter than this skip transcription
+RECENT_TRANSCRIPTS = 3  # transcript snippets included per recording in listings
+
+def get_openai_client():
+    """Return the shared OpenAI client, creating it on first use"""
+    global openai_client
+    
+    # Created lazily so the server starts without OPENAI_API_KEY set,
+    # a missing key then shows up as a transcription error
+    if openai_client is None:
+        openai_client = AsyncOpenAI(
+            # Reuse connections to the OpenAI API across transcription requests
+            http_client=httpx.AsyncClient(
+                http2=True,
+                timeout=30,
+                limits=httpx.Limits(max_keepalive_connections=8, keepalive_expiry=60),
+            )
+        )
+    return openai_client
+
+@app.on_event("shutdown")
+async def close_openai_client():
+    """Close pooled OpenAI connections"""
+    if openai_client is not None:
+        await openai_client.close()
 
 @app.post("/recording/start")
 async def start_recording():
@@ -40,19 +92,29 @@ async def start_recording():
     current_recording_id = recording_id
     
     recordings[recording_id] = {
-        "audio_data": bytearray(),
-        "transcription_buffer": bytearray(),
+        "audio_chunks": [],
+        "audio_len": 0,
+        "transcription_chunks": [],
+        "transcription_len": 0,
         "transcripts": [],
+        # Chunks are transcribed one at a time, in order, per recording
+        "transcription_lock": asyncio.Lock(),
+        "transcription_tasks": set(),
+        "last_broadcast_duration": None,
         "start_time": datetime.now().isoformat(),
         "end_time": None,
         "status": "recording"
     }
     
-    await broadcast_status({
+    # Evict the oldest recordings once over the limit
+    while len(recordings) > MAX_RECORDINGS:
+        recordings.popitem(last=False)
+    
+    run_in_background(broadcast_status({
         "type": "recording_started",
         "recording_id": recording_id,
         "timestamp": recordings[recording_id]["start_time"]
-    })
+    }))
     
     return {"ok": True, "recording_id": recording_id}
 
@@ -64,135 +126,214 @@ async def stop_recording():
     if not current_recording_id:
         return {"ok": False, "error": "No active recording"}
     
-    recording = recordings[current_recording_id]
+    # Detach the session before awaiting anything, so audio arriving while
+    # it is being finalized goes to a new recording instead
+    recording_id = current_recording_id
+    current_recording_id = None
+    
+    recording = recordings[recording_id]
     recording["end_time"] = datetime.now().isoformat()
     recording["status"] = "completed"
     
-    # Transcribe any remaining audio in buffer
-    if len(recording["transcription_buffer"]) > 0:
-        await transcribe_chunk(current_recording_id, force=True)
+    # Wait for in-flight chunks, then transcribe any remaining audio in buffer
+    if recording["transcription_tasks"]:
+        await asyncio.gather(*recording["transcription_tasks"])
+    if recording["transcription_len"] > 0:
+        await transcribe_chunk(recording_id, take_transcription_wav(recording))
     
     # Save final WAV file
-    filename = f"recording_{current_recording_id[:8]}.wav"
-    with wave.open(filename, "wb") as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(SAMPLE_WIDTH)
-        wf.setframerate(SAMPLE_RATE)
-        wf.writeframes(recording["audio_data"])
+    filename = f"recording_{recording_id[:8]}.wav"
+    wav_parts = [wav_header(recording["audio_len"]), *recording["audio_chunks"]]
+    try:
+        await asyncio.to_thread(write_file_atomic, filename, wav_parts)
+    except OSError as e:
+        print(f"Failed to save {filename}: {e}")
+        # Reactivate the session so the stop can be retried, unless new
+        # audio has already started another recording
+        if not current_recording_id:
+            current_recording_id = recording_id
+            recording["end_time"] = None
+            recording["status"] = "recording"
+        return {"ok": False, "error": f"Failed to save recording: {e}"}
     
     recording["filename"] = filename
     
-    await broadcast_status({
+    # Audio is on disk now, only keep metadata and transcripts in memory
+    recording["audio_chunks"] = []
+    
+    run_in_background(broadcast_status({
         "type": "recording_stopped",
-        "recording_id": current_recording_id,
+        "recording_id": recording_id,
         "timestamp": recording["end_time"],
-        "duration": len(recording["audio_data"]) // (SAMPLE_WIDTH * SAMPLE_RATE)
-    })
-    
-    stopped_id = current_recording_id
-    current_recording_id = None
+        "duration": recording["audio_len"] // (SAMPLE_WIDTH * SAMPLE_RATE)
+    }))
     
-    return {"ok": True, "recording_id": stopped_id}
+    return {"ok": True, "recording_id": recording_id}
 
 @app.post("/audio")
 async def receive_audio(data: dict):
-    """Receive audio chunks from ESP32"""
-    global current_recording_id
-    
-    # Auto-start recording if not active
-    if not current_recording_id:
-        await start_recording()
-    
-    recording = recordings[current_recording_id]
+    """Receive base64-encoded audio chunks from ESP32"""
+    await store_audio_chunk(a2b_base64(data["audio"]))
+    return {"ok": True}
+
+@app.post("/audio-raw")
+async def receive_audio_raw(request: Request):
+    """Receive raw 16-bit PCM audio chunks from ESP32"""
+    await store_audio_chunk(await request.body())
+    return {"ok": True}
+
+async def store_audio_chunk(audio_chunk: bytes):
+    """Append an audio chunk to the current recording"""
+    # Auto-start recording if not active. The session id is kept locally
+    # rather than re-reading the global, which another request may change
+    recording_id = current_recording_id
+    if not recording_id:
+        recording_id = (await start_recording())["recording_id"]
     
-    # Decode and store audio
-    audio_chunk = base64.b64decode(data["audio"])
-    recording["audio_data"].extend(audio_chunk)
-    recording["transcription_buffer"].extend(audio_chunk)
+    recording = recordings[recording_id]
     
-    # Transcribe when buffer is full
-    if len(recording["transcription_buffer"]) >= TRANSCRIPTION_CHUNK_SIZE:
-        await transcribe_chunk(current_recording_id)
+    # Store audio
+    recording["audio_chunks"].append(audio_chunk)
+    recording["audio_len"] += len(audio_chunk)
+    recording["transcription_chunks"].append(audio_chunk)
+    recording["transcription_len"] += len(audio_chunk)
     
-    # Broadcast update
-    await broadcast_status({
-        "type": "audio_update",
-        "recording_id": current_recording_id,
-        "samples": len(recording["audio_data"]) // SAMPLE_WIDTH,
-        "duration": len(recording["audio_data"]) // (SAMPLE_WIDTH * SAMPLE_RATE)
-    })
+    # Transcribe in the background when buffer is full
+    if recording["transcription_len"] >= TRANSCRIPTION_CHUNK_SIZE:
+        task = run_in_background(transcribe_chunk(recording_id, take_transcription_wav(recording)))
+        recording["transcription_tasks"].add(task)
+        task.add_done_callback(recording["transcription_tasks"].discard)
     
-    return {"ok": True}
+    # Broadcast update once per elapsed second, the UI only shows whole seconds
+    duration = recording["audio_len"] // (SAMPLE_WIDTH * SAMPLE_RATE)
+    if duration != recording["last_broadcast_duration"]:
+        recording["last_broadcast_duration"] = duration
+        run_in_background(broadcast_status({
+            "type": "audio_update",
+            "recording_id": recording_id,
+            "samples": recording["audio_len"] // SAMPLE_WIDTH,
+            "duration": duration
+        }))
+
+def wav_header(data_len: int) -> bytes:
+    """Build a WAV header for data_len bytes of PCM audio"""
+    header = bytearray(WAV_HEADER_TEMPLATE)
+    struct.pack_into("<I", header, 4, 36 + data_len)
+    struct.pack_into("<I", header, 40, data_len)
+    return bytes(header)
+
+def write_file_atomic(filename: str, parts: list):
+    """Write parts in order to a temp file and rename it into place"""
+    temp_file = f"{filename}.tmp"
+    fd = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+    try:
+        try:
+            # Parts are written one by one rather than joined, so the recording
+            # is never copied into a second buffer
+            for part in parts:
+                view = memoryview(part)
+                while view:
+                    view = view[os.write(fd, view):]
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(temp_file, filename)
+    except Exception:
+        try:
+            os.unlink(temp_file)
+        except OSError:
+            pass
+        raise
+
+def take_transcription_wav(recording: dict) -> bytes:
+    """Build a WAV file from a recording's pending audio and reset it"""
+    # Joining the header with the chunks copies the audio exactly once
+    wav = b"".join([wav_header(recording["transcription_len"]), *recording["transcription_chunks"]])
+    recording["transcription_chunks"] = []
+    recording["transcription_len"] = 0
+    return wav
 
-async def transcribe_chunk(recording_id: str, force: bool = False):
-    """Transcribe accumulated audio buffer for a recording"""
+def audio_rms(buffer: memoryview) -> float:
+    """Root mean square amplitude of 16-bit PCM audio"""
+    buffer = buffer[:len(buffer) - len(buffer) % SAMPLE_WIDTH]
+    if len(buffer) == 0:
+        return 0
+    if audioop:
+        return audioop.rms(buffer, SAMPLE_WIDTH)
+    samples = buffer.cast("h")
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+async def transcribe_chunk(recording_id: str, wav: bytes):
+    """Transcribe a WAV chunk taken from a recording's buffer"""
     recording = recordings.get(recording_id)
     if not recording:
         return
     
-    buffer = recording["transcription_buffer"]
+    buffer = memoryview(wav)[len(WAV_HEADER_TEMPLATE):]
     if len(buffer) == 0:
         return
     
-    # Save chunk to temp file
-    temp_file = f"temp_{recording_id}_{datetime.now().timestamp()}.wav"
-    with wave.open(temp_file, "wb") as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(SAMPLE_WIDTH)
-        wf.setframerate(SAMPLE_RATE)
-        wf.writeframes(buffer)
-    
-    try:
-        import openai
-        
-        with open(temp_file, "rb") as audio_file:
-            transcript = openai.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                language="en"
-            )
+    # Hold the lock across the whole chunk so transcripts are stored in audio order
+    async with recording["transcription_lock"]:
+        # Skip the API call for silent audio
+        if audio_rms(buffer) < SILENCE_RMS_THRESHOLD:
+            return
         
-        # Store transcript
-        transcript_entry = {
-            "text": transcript.text,
-            "timestamp": datetime.now().isoformat()
-        }
-        recording["transcripts"].append(transcript_entry)
-        
-        # Broadcast to connected clients
-        await broadcast_status({
-            "type": "transcription",
-            "recording_id": recording_id,
-            "text": transcript.text,
-            "timestamp": transcript_entry["timestamp"]
-        })
-        
-        # Clear buffer after successful transcription
-        recording["transcription_buffer"] = bytearray()
-        
-    except Exception as e:
-        print(f"Transcription error: {e}")
-    finally:
-        if os.path.exists(temp_file):
-            os.remove(temp_file)
+        try:
+            # Reuse the transcript of identical audio
+            key = hashlib.blake2b(buffer, digest_size=16).digest()
+            text = transcript_cache.get(key)
+            if text is not None:
+                transcript_cache.move_to_end(key)
+            else:
+                transcript = await get_openai_client().audio.transcriptions.create(
+                    model="whisper-1",
+                    file=("chunk.wav", wav, "audio/wav"),
+                    language="en"
+                )
+                text = transcript.text
+                
+                transcript_cache[key] = text
+                if len(transcript_cache) > TRANSCRIPT_CACHE_SIZE:
+                    transcript_cache.popitem(last=False)
+            
+            # Store transcript
+            transcript_entry = {
+                "text": text,
+                "timestamp": datetime.now().isoformat()
+            }
+            recording["transcripts"].append(transcript_entry)
+            
+            # Broadcast to connected clients
+            run_in_background(broadcast_status({
+                "type": "transcription",
+                "recording_id": recording_id,
+                "text": text,
+                "timestamp": transcript_entry["timestamp"]
+            }))
+            
+        except Exception as e:
+            print(f"Transcription error: {e}")
 
 @app.get("/recordings")
-async def list_recordings():
-    """Get all recordings with their transcripts"""
+async def list_recordings(limit: int = 20, offset: int = 0):
+    """Get a page of recordings with their most recent transcripts"""
     result = []
-    for rec_id, rec_data in recordings.items():
+    offset = max(offset, 0)
+    # Recordings are inserted in start order, so iterate newest first
+    page = islice(reversed(recordings.items()), offset, offset + max(limit, 0))
+    for rec_id, rec_data in page:
         result.append({
             "id": rec_id,
             "start_time": rec_data["start_time"],
             "end_time": rec_data["end_time"],
             "status": rec_data["status"],
-            "duration": len(rec_data["audio_data"]) // (SAMPLE_WIDTH * SAMPLE_RATE),
-            "transcripts": rec_data["transcripts"],
+            "duration": rec_data["audio_len"] // (SAMPLE_WIDTH * SAMPLE_RATE),
+            "transcript_count": len(rec_data["transcripts"]),
+            "transcripts": rec_data["transcripts"][-RECENT_TRANSCRIPTS:],
             "filename": rec_data.get("filename")
         })
     
-    # Sort by start time, newest first
-    result.sort(key=lambda x: x["start_time"], reverse=True)
     return result
 
 @app.get("/recording/{recording_id}")
@@ -207,11 +348,26 @@ async def get_recording(recording_id: str):
         "start_time": rec_data["start_time"],
         "end_time": rec_data["end_time"],
         "status": rec_data["status"],
-        "duration": len(rec_data["audio_data"]) // (SAMPLE_WIDTH * SAMPLE_RATE),
+        "duration": rec_data["audio_len"] // (SAMPLE_WIDTH * SAMPLE_RATE),
         "transcripts": rec_data["transcripts"],
         "filename": rec_data.get("filename")
     }
 
+@app.get("/recording/{recording_id}/transcripts")
+async def get_recording_transcripts(recording_id: str, limit: int = 50, offset: int = 0):
+    """Get a page of transcripts for a recording"""
+    if recording_id not in recordings:
+        return {"error": "Recording not found"}
+    
+    transcripts = recordings[recording_id]["transcripts"]
+    offset = max(offset, 0)
+    return {
+        "id": recording_id,
+        "total": len(transcripts),
+        "offset": offset,
+        "transcripts": transcripts[offset:offset + max(limit, 0)]
+    }
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket for live updates"""
@@ -231,24 +387,50 @@ async def websocket_endpoint(websocket: WebSocket):
     except:
         pass
     finally:
-        active_websockets.remove(websocket)
+        active_websockets.discard(websocket)
+
+def run_in_background(coro):
+    """Schedule a coroutine without awaiting it, keeping a reference until done"""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
 
 async def broadcast_status(message: dict):
     """Broadcast to all connected WebSocket clients"""
-    disconnected = set()
-    for ws in active_websockets:
+    clients = list(active_websockets)
+    # Text frames need str, the browser client parses them with JSON.parse
+    payload = orjson.dumps(message).decode()
+    
+    async def safe_send(ws):
         try:
-            await ws.send_json(message)
-        except:
-            disconnected.add(ws)
+            await asyncio.wait_for(ws.send_text(payload), timeout=BROADCAST_SEND_TIMEOUT)
+        except Exception:
+            # A timed out send may have left a partial frame, so stop sending
+            # to the socket and close it; the client reconnects. The close
+            # handshake can take much longer than a send on a stuck client,
+            # so it runs outside this broadcast
+            active_websockets.discard(ws)
+            run_in_background(close_websocket(ws))
     
-    for ws in disconnected:
-        active_websockets.discard(ws)
+    if len(clients) <= BROADCAST_BATCH_SIZE:
+        await asyncio.gather(*(safe_send(ws) for ws in clients))
+    else:
+        # Send in batches, yielding to the event loop between them
+        for i in range(0, len(clients), BROADCAST_BATCH_SIZE):
+            batch = clients[i:i + BROADCAST_BATCH_SIZE]
+            await asyncio.gather(*(safe_send(ws) for ws in batch))
+            await asyncio.sleep(0)
 
-@app.get("/")
-async def get_client():
-    """Web interface for viewing recordings"""
-    html_content = """
+async def close_websocket(ws: WebSocket):
+    """Close a WebSocket, ignoring errors from an already broken connection"""
+    try:
+        await asyncio.wait_for(ws.close(), timeout=BROADCAST_SEND_TIMEOUT)
+    except Exception:
+        pass
+
+# Web interface, encoded once at import
+INDEX_HTML = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -376,6 +558,17 @@ async def get_client():
                 margin-bottom: 20px;
                 opacity: 0.3;
             }
+            .load-more {
+                display: block;
+                margin: 12px auto 0;
+                padding: 8px 16px;
+                border: none;
+                border-radius: 8px;
+                background: #667eea;
+                color: white;
+                font-size: 0.9em;
+                cursor: pointer;
+            }
         </style>
     </head>
     <body>
@@ -399,49 +592,78 @@ async def get_client():
                     <p>Press the button on your device to start recording</p>
                 </div>
             </div>
+            <button class="load-more" id="loadMoreRecordings" onclick="loadMoreRecordings()" style="display: none;">
+                Load older recordings
+            </button>
         </div>
         
         <script>
-            const ws = new WebSocket('ws://' + window.location.host + '/ws');
+            const RECORDINGS_PAGE_SIZE = 20;
+            const TRANSCRIPTS_PAGE_SIZE = 50;
             let currentRecordingId = null;
+            let recordingsOffset = 0;
             
-            ws.onopen = () => {
-                console.log('Connected');
-                loadRecordings();
-            };
-            
-            ws.onmessage = (event) => {
-                const data = JSON.parse(event.data);
-                console.log('Message:', data);
+            function connect() {
+                const ws = new WebSocket('ws://' + window.location.host + '/ws');
                 
-                if (data.type === 'recording_started') {
-                    currentRecordingId = data.recording_id;
-                    document.getElementById('recordingDot').classList.add('active');
-                    document.getElementById('statusText').textContent = 'Recording...';
+                ws.onopen = () => {
+                    console.log('Connected');
                     loadRecordings();
-                }
+                };
                 
-                if (data.type === 'recording_stopped') {
-                    currentRecordingId = null;
-                    document.getElementById('recordingDot').classList.remove('active');
-                    document.getElementById('statusText').textContent = 'Ready';
-                    loadRecordings();
-                }
+                // Reconnect if the server drops us, e.g. after a stalled send
+                ws.onclose = () => {
+                    console.log('Disconnected');
+                    setTimeout(connect, 1000);
+                };
                 
-                if (data.type === 'audio_update') {
-                    updateRecordingDuration(data.recording_id, data.duration);
-                }
-                
-                if (data.type === 'transcription') {
-                    addTranscript(data.recording_id, data.text, data.timestamp);
-                }
-            };
+                ws.onmessage = (event) => {
+                    const data = JSON.parse(event.data);
+                    console.log('Message:', data);
+                    
+                    // Sync recording state on (re)connect
+                    if (data.type === 'connected') {
+                        currentRecordingId = data.current_recording;
+                        document.getElementById('recordingDot').classList.toggle('active', !!currentRecordingId);
+                        document.getElementById('statusText').textContent = currentRecordingId ? 'Recording...' : 'Ready';
+                    }
+                    
+                    if (data.type === 'recording_started') {
+                        currentRecordingId = data.recording_id;
+                        document.getElementById('recordingDot').classList.add('active');
+                        document.getElementById('statusText').textContent = 'Recording...';
+                        loadRecordings();
+                    }
+                    
+                    if (data.type === 'recording_stopped') {
+                        // A newer session may already have started while this one was finalized
+                        if (data.recording_id === currentRecordingId) {
+                            currentRecordingId = null;
+                            document.getElementById('recordingDot').classList.remove('active');
+                            document.getElementById('statusText').textContent = 'Ready';
+                        }
+                        loadRecordings();
+                    }
+                    
+                    if (data.type === 'audio_update') {
+                        updateRecordingDuration(data.recording_id, data.duration);
+                    }
+                    
+                    if (data.type === 'transcription') {
+                        addTranscript(data.recording_id, data.text, data.timestamp);
+                    }
+                };
+            }
+            
+            connect();
             
             async function loadRecordings() {
-                const response = await fetch('/recordings');
+                const response = await fetch(`/recordings?limit=${RECORDINGS_PAGE_SIZE}&offset=0`);
                 const recordings = await response.json();
                 
                 const container = document.getElementById('recordings');
+                recordingsOffset = recordings.length;
+                updateLoadMoreRecordings(recordings.length);
                 
                 if (recordings.length === 0) {
                     container.innerHTML = `
@@ -461,17 +683,63 @@ async def get_client():
                 container.innerHTML = recordings.map(rec => createRecordingCard(rec)).join('');
             }
             
+            async function loadMoreRecordings() {
+                const response = await fetch(`/recordings?limit=${RECORDINGS_PAGE_SIZE}&offset=${recordingsOffset}`);
+                const recordings = await response.json();
+                
+                recordingsOffset += recordings.length;
+                updateLoadMoreRecordings(recordings.length);
+                document.getElementById('recordings')
+                    .insertAdjacentHTML('beforeend', recordings.map(rec => createRecordingCard(rec)).join(''));
+            }
+            
+            function updateLoadMoreRecordings(pageLength) {
+                // A full page means there may be older recordings
+                document.getElementById('loadMoreRecordings').style.display =
+                    pageLength === RECORDINGS_PAGE_SIZE ? 'block' : 'none';
+            }
+            
+            async function showAllTranscripts(recordingId) {
+                const transcripts = [];
+                let total = Infinity;
+                while (transcripts.length < total) {
+                    const response = await fetch(
+                        `/recording/${recordingId}/transcripts?limit=${TRANSCRIPTS_PAGE_SIZE}&offset=${transcripts.length}`
+                    );
+                    const page = await response.json();
+                    if (page.error || page.transcripts.length === 0) break;
+                    total = page.total;
+                    transcripts.push(...page.transcripts);
+                }
+                
+                const container = document.getElementById(`transcripts-${recordingId}`);
+                if (container) {
+                    container.innerHTML = transcripts.map(t => createTranscript(t.text, t.timestamp)).join('');
+                }
+                const button = document.getElementById(`show-all-${recordingId}`);
+                if (button) button.remove();
+            }
+            
+            function createTranscript(text, timestamp) {
+                return `
+                    <div class="transcript">
+                        <div class="transcript-time">${new Date(timestamp).toLocaleTimeString()}</div>
+                        <div class="transcript-text">${text}</div>
+                    </div>
+                `;
+            }
+            
             function createRecordingCard(rec) {
                 const startTime = new Date(rec.start_time);
                 const timeStr = startTime.toLocaleString();
                 const duration = formatDuration(rec.duration);
                 
-                const transcripts = rec.transcripts.map(t => `
-                    <div class="transcript">
-                        <div class="transcript-time">${new Date(t.timestamp).toLocaleTimeString()}</div>
-                        <div class="transcript-text">${t.text}</div>
-                    </div>
-                `).join('');
+                const transcripts = rec.transcripts.map(t => createTranscript(t.text, t.timestamp)).join('');
+                const showAll = rec.transcript_count > rec.transcripts.length ? `
+                    <button class="load-more" id="show-all-${rec.id}" onclick="showAllTranscripts('${rec.id}')">
+                        Show all ${rec.transcript_count} segments
+                    </button>
+                ` : '';
                 
                 return `
                     <div class="recording-card" id="recording-${rec.id}">
@@ -483,11 +751,12 @@ async def get_client():
                         </div>
                         <div class="recording-meta">
                             <span>⏱️ <span id="duration-${rec.id}">${duration}</span></span>
-                            <span>💬 ${rec.transcripts.length} segments</span>
+                            <span>💬 <span id="count-${rec.id}">${rec.transcript_count}</span> segments</span>
                         </div>
                         <div id="transcripts-${rec.id}">
                             ${transcripts || '<p style="color: #999; padding: 20px 0;">Waiting for transcription...</p>'}
                         </div>
+                        ${showAll}
                     </div>
                 `;
             }
@@ -503,19 +772,14 @@ async def get_client():
                 const container = document.getElementById(`transcripts-${recordingId}`);
                 if (!container) return;
                 
-                const time = new Date(timestamp).toLocaleTimeString();
-                const transcript = document.createElement('div');
-                transcript.className = 'transcript';
-                transcript.innerHTML = `
-                    <div class="transcript-time">${time}</div>
-                    <div class="transcript-text">${text}</div>
-                `;
-                
                 // Remove "waiting" message if present
                 const waiting = container.querySelector('p');
                 if (waiting) waiting.remove();
                 
-                container.appendChild(transcript);
+                container.insertAdjacentHTML('beforeend', createTranscript(text, timestamp));
+                
+                const count = document.getElementById(`count-${recordingId}`);
+                if (count) count.textContent = Number(count.textContent) + 1;
             }
             
             function formatDuration(seconds) {
@@ -526,8 +790,27 @@ async def get_client():
         </script>
     </body>
     </html>
-    """
-    return HTMLResponse(content=html_content)
+"""
+INDEX_HTML_BYTES = INDEX_HTML.encode("utf-8")
+INDEX_HTML_ETAG = '"' + hashlib.blake2b(INDEX_HTML_BYTES, digest_size=16).hexdigest() + '"'
+
+def etag_matches(if_none_match: str) -> bool:
+    """Check an If-None-Match header against the page ETag, using weak comparison"""
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == INDEX_HTML_ETAG:
+            return True
+    return False
+
+@app.get("/")
+async def get_client(request: Request):
+    """Web interface for viewing recordings"""
+    headers = {"Cache-Control": "public, max-age=3600", "ETag": INDEX_HTML_ETAG}
+    if etag_matches(request.headers.get("if-none-match", "")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=INDEX_HTML_BYTES, media_type="text/html", headers=headers)
 
 if __name__ == "__main__":
     import uvicorn